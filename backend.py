@@ -1,21 +1,151 @@
+import os
+import queue
+import threading
+import time
+from functools import lru_cache
 import ollama
 from prompt import study_prompt
+from database import db
 
-def generate_study_response(context_text, user_question):
+# Upper bound on study material sent to the model; keeps prefill (and TTFT) bounded
+MAX_CONTEXT_CHARS = 12000
+
+# Ollama server and generation limits. num_ctx leaves room for
+# MAX_CONTEXT_CHARS (~4 chars per token), the template and num_predict.
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_TIMEOUT = 120
+OLLAMA_OPTIONS = {"num_ctx": 4096, "num_predict": 512}
+
+# Shared client so every request reuses the same keep-alive HTTP connection
+client = ollama.Client(host=OLLAMA_HOST, timeout=OLLAMA_TIMEOUT)
+
+@lru_cache(maxsize=32)
+def get_study_context(session_id, content_key):
+    """
+    Returns the session's study material capped at MAX_CONTEXT_CHARS, newest
+    upload first so a file just added is never the one cut off.
+    content_key must change whenever the session's files change (e.g. the
+    tuple of file ids), so repeated questions skip the content query.
+    """
+
+    return db.get_session_content(session_id)[:MAX_CONTEXT_CHARS]
+
+class StreamBuffer:
+    """
+    Coalesces streamed tokens so the UI re-renders in batches.
+
+    A batch is ready once it reaches the current flush size, contains a
+    newline, or max_interval seconds have passed since the last flush. The
+    flush size starts at one token for a fast first paint and doubles after
+    every flush up to max_chars.
+    """
+
+    def __init__(self, max_chars=64, max_interval=0.025):
+        self.max_chars = max_chars
+        self.max_interval = max_interval
+        self._flush_size = 1
+        self._pending = []
+        self._pending_len = 0
+        self._last_flush = time.monotonic()
+
+    def add(self, token):
+        """Buffer a token and return True when a flush is due"""
+        self._pending.append(token)
+        self._pending_len += len(token)
+        return (
+            self._pending_len >= self._flush_size
+            or "\n" in token
+            or time.monotonic() - self._last_flush >= self.max_interval
+        )
+
+    def flush(self):
+        """Return and clear everything buffered since the last flush"""
+        text = "".join(self._pending)
+        self._pending = []
+        self._pending_len = 0
+        self._last_flush = time.monotonic()
+        self._flush_size = min(self._flush_size * 2, self.max_chars)
+        return text
+
+def generate_study_response(context_text, user_question, prompt=None):
     """
-    Generator that yields tokens from Ollama
+    Generator that yields tokens from Ollama.
+    Pass a pre-built prompt to skip building it from context and question.
     """
 
-    prompt = study_prompt(context_text, user_question)
+    if prompt is None:
+        prompt = study_prompt(context_text, user_question)
 
-    stream = ollama.generate(
+    stream = client.generate(
         model="llama3.2:1b",
         prompt=prompt,
         stream=True,
+        options=OLLAMA_OPTIONS,
     )
 
     for chunk in stream:
         if "response" in chunk:
             yield chunk["response"]
-    
-    # No changes needed here - backend remains the same
\ No newline at end of file
+
+# Marks the end of a background stream
+_STREAM_DONE = object()
+
+def stream_in_background(tokens, maxsize=256, poll_interval=0.025):
+    """
+    Drains a token generator on a worker thread and yields whatever has
+    accumulated since the last yield, so model decoding overlaps with
+    rendering on the caller's thread. Exceptions raised by the generator
+    are re-raised in the caller.
+    """
+
+    token_queue = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item):
+        # Give up once the consumer has gone away instead of blocking forever
+        while not stopped.is_set():
+            try:
+                token_queue.put(item, timeout=poll_interval)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for token in tokens:
+                if not put(token):
+                    return
+        except Exception as e:
+            put((_STREAM_DONE, e))
+            return
+        put((_STREAM_DONE, None))
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+
+    try:
+        while True:
+            try:
+                batch = [token_queue.get(timeout=poll_interval)]
+            except queue.Empty:
+                continue
+
+            while True:
+                try:
+                    batch.append(token_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            done = batch[-1]
+            if isinstance(done, tuple) and done[0] is _STREAM_DONE:
+                text = "".join(batch[:-1])
+                if text:
+                    yield text
+                if done[1] is not None:
+                    raise done[1]
+                return
+
+            yield "".join(batch)
+    finally:
+        stopped.set()
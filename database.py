@@ -1,26 +1,248 @@
 import sqlite3
 import os
+import shutil
+import io
+import queue
 import threading
+import time
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from contextlib import contextmanager
 
 # Database file path
 DB_FILE = "data/study_ai.db"
 
+# Directory holding uploaded files
+UPLOADS_DIR = "data/uploads"
+
 # Thread-local storage for database connections
 thread_local = threading.local()
 
+# Size of sqlite3's per-connection prepared statement cache (default 128)
+STATEMENT_CACHE_SIZE = 256
+
+# Rows sent per executemany() call in bulk inserts
+BULK_CHUNK_SIZE = 50
+
+# Seconds that sidebar aggregates (stats, session list) are served from cache
+CACHE_TTL = 2.0
+CACHE_MAX_ENTRIES = 8
+
+# Maximum number of pooled read-only connections
+READ_POOL_SIZE = 4
+
+# Ids bound per IN (...) list, well under SQLite's 999 variable limit
+IN_CHUNK_SIZE = 500
+
+# Background workers that remove uploaded files from disk
+unlink_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="unlink")
+
+# ================= SQL STATEMENTS =================
+# Kept as module-level constants so every call passes the identical string
+# object and hits the connection's statement cache instead of re-preparing.
+
+SQL_CREATE_SESSIONS = '''
+    CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_name TEXT DEFAULT 'Untitled Session',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_active BOOLEAN DEFAULT 0,
+        last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+SQL_CREATE_FILES = '''
+    CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        filename TEXT NOT NULL,
+        filepath TEXT NOT NULL,
+        filesize INTEGER,
+        content_text TEXT,
+        upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        file_type TEXT,
+        file_hash TEXT,
+        FOREIGN KEY (session_id) REFERENCES sessions (id) ON DELETE CASCADE
+    )
+'''
+
+# Databases created before file_hash existed get the column added in place
+SQL_FILES_COLUMNS = 'PRAGMA table_info(files)'
+SQL_ADD_FILE_HASH_COLUMN = 'ALTER TABLE files ADD COLUMN file_hash TEXT'
+
+SQL_CREATE_CHATS = '''
+    CREATE TABLE IF NOT EXISTS chats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (session_id) REFERENCES sessions (id) ON DELETE CASCADE
+    )
+'''
+
+SQL_CREATE_INDEX_SESSIONS_ACTIVE = 'CREATE INDEX IF NOT EXISTS idx_sessions_active ON sessions(is_active)'
+SQL_CREATE_INDEX_FILES_SESSION = 'CREATE INDEX IF NOT EXISTS idx_files_session_time ON files(session_id, upload_time DESC)'
+SQL_CREATE_INDEX_FILES_HASH = 'CREATE INDEX IF NOT EXISTS idx_files_hash ON files(file_hash)'
+SQL_CREATE_INDEX_CHATS_SESSION = 'CREATE INDEX IF NOT EXISTS idx_chats_session_time ON chats(session_id, created_at)'
+
+# Single-column indexes superseded by the composite ones above
+SQL_DROP_INDEX_FILES_SESSION_OLD = 'DROP INDEX IF EXISTS idx_files_session'
+SQL_DROP_INDEX_CHATS_SESSION_OLD = 'DROP INDEX IF EXISTS idx_chats_session'
+
+# Transactions
+SQL_BEGIN_IMMEDIATE = 'BEGIN IMMEDIATE'
+
+# Maintenance
+SQL_ANALYZE = 'ANALYZE'
+SQL_VACUUM = 'VACUUM'
+SQL_DELETE_ALL_CHATS = 'DELETE FROM chats'
+SQL_DELETE_ALL_FILES = 'DELETE FROM files'
+SQL_DELETE_ALL_SESSIONS = 'DELETE FROM sessions'
+
+# Sessions
+SQL_HAS_ACTIVE = 'SELECT id FROM sessions WHERE is_active = 1 LIMIT 1'
+SQL_INSERT_SESSION = 'INSERT INTO sessions (session_name, is_active) VALUES (?, ?)'
+SQL_DEACTIVATE_ALL = 'UPDATE sessions SET is_active = 0'
+SQL_GET_ACTIVE = '''
+    SELECT id, session_name, created_at, last_accessed 
+    FROM sessions WHERE is_active = 1 LIMIT 1
+'''
+SQL_ACTIVATE_SESSION = '''
+    UPDATE sessions 
+    SET is_active = 1, last_accessed = CURRENT_TIMESTAMP 
+    WHERE id = ?
+'''
+SQL_GET_ALL_SESSIONS = '''
+    SELECT s.id, s.session_name, s.created_at, s.last_accessed, s.is_active,
+           COALESCE(f.file_count, 0) AS file_count,
+           COALESCE(c.chat_count, 0) AS chat_count
+    FROM sessions s
+    LEFT JOIN (SELECT session_id, COUNT(*) AS file_count
+               FROM files GROUP BY session_id) f ON f.session_id = s.id
+    LEFT JOIN (SELECT session_id, COUNT(*) AS chat_count
+               FROM chats GROUP BY session_id) c ON c.session_id = s.id
+    ORDER BY s.last_accessed DESC
+    LIMIT ?
+'''
+SQL_DELETE_SESSION = 'DELETE FROM sessions WHERE id = ?'
+SQL_TOUCH_SESSION = '''
+    UPDATE sessions 
+    SET last_accessed = CURRENT_TIMESTAMP 
+    WHERE id = ?
+'''
+
+# Files
+SQL_INSERT_FILE = '''
+    INSERT INTO files (session_id, filename, filepath, filesize, content_text, file_type, file_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_GET_SESSION_FILES = '''
+    SELECT id, filename, COALESCE(filesize, 0) AS filesize, upload_time,
+           COALESCE(NULLIF(file_type, ''), 'Unknown') AS file_type
+    FROM files 
+    WHERE session_id = ?
+    ORDER BY upload_time DESC
+'''
+SQL_GET_FILE_CONTENT = 'SELECT content_text FROM files WHERE id = ?'
+SQL_GET_CONTENT_BY_HASH = '''
+    SELECT content_text FROM files
+    WHERE file_hash = ? AND content_text IS NOT NULL
+    LIMIT 1
+'''
+SQL_GET_SESSION_CONTENT = '''
+    SELECT content_text FROM files 
+    WHERE session_id = ? AND content_text IS NOT NULL AND content_text != ''
+    ORDER BY upload_time DESC, id DESC
+'''
+SQL_DELETE_FILE = 'DELETE FROM files WHERE id = ?'
+SQL_GET_ALL_FILEPATHS = 'SELECT filepath FROM files'
+SQL_GET_FILEPATHS_IN = 'SELECT filepath FROM files WHERE id IN ({placeholders})'
+SQL_DELETE_FILES_IN = 'DELETE FROM files WHERE id IN ({placeholders})'
+
+# Chats
+SQL_INSERT_CHAT = '''
+    INSERT INTO chats (session_id, question, answer)
+    VALUES (?, ?, ?)
+'''
+SQL_GET_SESSION_CHATS = '''
+    SELECT id, question, answer, created_at FROM (
+        SELECT id, question, answer, created_at 
+        FROM chats 
+        WHERE session_id = ?
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    )
+    ORDER BY created_at ASC, id ASC
+'''
+SQL_GET_ALL_CHATS = '''
+    SELECT c.id, c.question, c.answer, c.created_at, s.session_name
+    FROM chats c
+    JOIN sessions s ON c.session_id = s.id
+    ORDER BY c.created_at DESC
+    LIMIT ?
+'''
+SQL_DELETE_SESSION_CHATS = 'DELETE FROM chats WHERE session_id = ?'
+SQL_LAST_INSERT_ID = 'SELECT last_insert_rowid()'
+
+# Statistics
+SQL_GET_STATS = '''
+    SELECT (SELECT COUNT(*) FROM sessions) AS total_sessions,
+           (SELECT COUNT(*) FROM sessions WHERE is_active = 1) AS active_sessions,
+           (SELECT COUNT(*) FROM files) AS total_files,
+           (SELECT COALESCE(SUM(filesize), 0) FROM files) AS total_size,
+           (SELECT COUNT(*) FROM chats) AS total_chats
+'''
+
+def _remove_file(filepath):
+    """Remove a file from disk, ignoring ones that are already gone"""
+    try:
+        os.unlink(filepath)
+    except OSError:
+        pass
+
 class Database:
     def __init__(self):
+        # Short-lived cache for sidebar queries, keyed by the data version
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._data_version = 0
+        
+        # Read-only connections shared by all threads (writers stay thread-local)
+        self._read_pool = queue.LifoQueue()
+        self._read_pool_lock = threading.Lock()
+        self._read_pool_opened = 0
         self._init_db()
     
+    def _open_connection(self, read_only=False):
+        """Open and configure a new database connection"""
+        os.makedirs("data", exist_ok=True)
+        # Autocommit mode: get_cursor issues explicit BEGIN/COMMIT itself
+        conn = sqlite3.connect(
+            DB_FILE,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row
+
+        # WAL + relaxed sync: one fsync per checkpoint instead of per commit
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -20000")
+        conn.execute("PRAGMA mmap_size = 268435456")
+        conn.execute("PRAGMA foreign_keys = ON")
+        if read_only:
+            conn.execute("PRAGMA query_only = 1")
+        return conn
+    
     def _get_connection(self):
         """Get thread-local database connection"""
         if not hasattr(thread_local, 'connection'):
-            os.makedirs("data", exist_ok=True)
-            thread_local.connection = sqlite3.connect(DB_FILE, check_same_thread=False)
-            thread_local.connection.row_factory = sqlite3.Row
-            thread_local.connection.execute("PRAGMA foreign_keys = ON")
+            thread_local.connection = self._open_connection()
         return thread_local.connection
     
     def _close_connection(self):
@@ -29,76 +251,111 @@ class Database:
             thread_local.connection.close()
             del thread_local.connection
     
+    @contextmanager
+    def get_read_cursor(self):
+        """Context manager for read-only queries on a pooled connection"""
+        try:
+            conn = self._read_pool.get_nowait()
+        except queue.Empty:
+            with self._read_pool_lock:
+                can_open = self._read_pool_opened < READ_POOL_SIZE
+                if can_open:
+                    self._read_pool_opened += 1
+            if can_open:
+                try:
+                    conn = self._open_connection(read_only=True)
+                except Exception:
+                    with self._read_pool_lock:
+                        self._read_pool_opened -= 1
+                    raise
+            else:
+                conn = self._read_pool.get()
+        
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            self._read_pool.put(conn)
+    
     @contextmanager
     def get_cursor(self):
         """Context manager for database operations"""
         conn = self._get_connection()
         cursor = conn.cursor()
+        changes_before = conn.total_changes
         try:
+            # One explicit write transaction per block: a single commit (and
+            # fsync) no matter how many statements run inside it
+            cursor.execute(SQL_BEGIN_IMMEDIATE)
             yield cursor
             conn.commit()
         except Exception as e:
-            conn.rollback()
+            if conn.in_transaction:
+                conn.rollback()
             raise e
         finally:
             cursor.close()
+        
+        # Any committed row change makes cached query results stale
+        if conn.total_changes != changes_before:
+            self._invalidate_cache()
+    
+    def _invalidate_cache(self):
+        """Drop cached query results after a write"""
+        with self._cache_lock:
+            self._data_version += 1
+            self._cache.clear()
+    
+    def _cached(self, key, loader):
+        """Return a cached result, reloading after CACHE_TTL or any write"""
+        key = (key, self._data_version)
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry and now - entry[0] < CACHE_TTL:
+                return entry[1]
+        
+        value = loader()
+        with self._cache_lock:
+            if len(self._cache) >= CACHE_MAX_ENTRIES:
+                self._cache.clear()
+            self._cache[key] = (now, value)
+        return value
     
     def _init_db(self):
         """Initialize database with proper schema"""
         with self.get_cursor() as cursor:
-            # Create sessions table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_name TEXT DEFAULT 'Untitled Session',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 0,
-                    last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            # Create tables
+            cursor.execute(SQL_CREATE_SESSIONS)
+            cursor.execute(SQL_CREATE_FILES)
+            cursor.execute(SQL_CREATE_CHATS)
             
-            # Create files table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS files (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id INTEGER NOT NULL,
-                    filename TEXT NOT NULL,
-                    filepath TEXT NOT NULL,
-                    filesize INTEGER,
-                    content_text TEXT,
-                    upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    file_type TEXT,
-                    FOREIGN KEY (session_id) REFERENCES sessions (id) ON DELETE CASCADE
-                )
-            ''')
-            
-            # Create chats table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS chats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id INTEGER NOT NULL,
-                    question TEXT NOT NULL,
-                    answer TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (session_id) REFERENCES sessions (id) ON DELETE CASCADE
-                )
-            ''')
+            # Add columns introduced after the original schema
+            cursor.execute(SQL_FILES_COLUMNS)
+            if 'file_hash' not in {row['name'] for row in cursor.fetchall()}:
+                cursor.execute(SQL_ADD_FILE_HASH_COLUMN)
             
             # Create indexes
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_active ON sessions(is_active)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_files_session ON files(session_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_chats_session ON chats(session_id)')
+            cursor.execute(SQL_DROP_INDEX_FILES_SESSION_OLD)
+            cursor.execute(SQL_DROP_INDEX_CHATS_SESSION_OLD)
+            cursor.execute(SQL_CREATE_INDEX_SESSIONS_ACTIVE)
+            cursor.execute(SQL_CREATE_INDEX_FILES_SESSION)
+            cursor.execute(SQL_CREATE_INDEX_FILES_HASH)
+            cursor.execute(SQL_CREATE_INDEX_CHATS_SESSION)
         
         # Ensure there's at least one active session
         self._ensure_active_session()
+        
+        # Refresh query planner statistics
+        self._get_connection().execute(SQL_ANALYZE)
     
     def _ensure_active_session(self):
         """Ensure there's always one active session"""
         with self.get_cursor() as cursor:
-            cursor.execute('SELECT id FROM sessions WHERE is_active = 1 LIMIT 1')
+            cursor.execute(SQL_HAS_ACTIVE)
             if not cursor.fetchone():
-                cursor.execute('INSERT INTO sessions (session_name, is_active) VALUES (?, ?)', 
-                             ('Default Session', 1))
+                cursor.execute(SQL_INSERT_SESSION, ('Default Session', 1))
     
     # ================= SESSION MANAGEMENT =================
     
@@ -108,260 +365,229 @@ class Database:
             session_name = f"Session {datetime.now().strftime('%Y-%m-%d %H:%M')}"
         
         with self.get_cursor() as cursor:
-            cursor.execute('UPDATE sessions SET is_active = 0')
-            cursor.execute('INSERT INTO sessions (session_name, is_active) VALUES (?, ?)', 
-                         (session_name, 1))
+            cursor.execute(SQL_DEACTIVATE_ALL)
+            cursor.execute(SQL_INSERT_SESSION, (session_name, 1))
             return cursor.lastrowid
     
     def get_active_session(self):
         """Get the currently active session"""
-        with self.get_cursor() as cursor:
-            cursor.execute('''
-                SELECT id, session_name, created_at, last_accessed 
-                FROM sessions WHERE is_active = 1 LIMIT 1
-            ''')
+        with self.get_read_cursor() as cursor:
+            cursor.execute(SQL_GET_ACTIVE)
             row = cursor.fetchone()
             if row:
-                return {
-                    'id': row[0],
-                    'session_name': row[1],
-                    'created_at': row[2],
-                    'last_accessed': row[3]
-                }
+                return dict(row)
         return None
     
     def set_active_session(self, session_id):
         """Set a session as active"""
         with self.get_cursor() as cursor:
-            cursor.execute('UPDATE sessions SET is_active = 0')
-            cursor.execute('''
-                UPDATE sessions 
-                SET is_active = 1, last_accessed = CURRENT_TIMESTAMP 
-                WHERE id = ?
-            ''', (session_id,))
+            cursor.execute(SQL_DEACTIVATE_ALL)
+            cursor.execute(SQL_ACTIVATE_SESSION, (session_id,))
             return cursor.rowcount > 0
     
     def get_all_sessions(self, limit=20):
         """Get all sessions"""
-        with self.get_cursor() as cursor:
-            cursor.execute('''
-                SELECT id, session_name, created_at, last_accessed, is_active,
-                       (SELECT COUNT(*) FROM files WHERE session_id = sessions.id) as file_count,
-                       (SELECT COUNT(*) FROM chats WHERE session_id = sessions.id) as chat_count
-                FROM sessions
-                ORDER BY last_accessed DESC
-                LIMIT ?
-            ''', (limit,))
+        return self._cached(('get_all_sessions', limit),
+                            lambda: self._load_all_sessions(limit))
+    
+    def _load_all_sessions(self, limit):
+        with self.get_read_cursor() as cursor:
+            cursor.execute(SQL_GET_ALL_SESSIONS, (limit,))
             
-            sessions = []
-            for row in cursor.fetchall():
-                sessions.append({
-                    'id': row[0],
-                    'session_name': row[1],
-                    'created_at': row[2],
-                    'last_accessed': row[3],
-                    'is_active': bool(row[4]),
-                    'file_count': row[5] or 0,
-                    'chat_count': row[6] or 0
-                })
+            sessions = [dict(row) for row in cursor]
+            for session in sessions:
+                session['is_active'] = bool(session['is_active'])
             return sessions
     
     def delete_session(self, session_id):
         """Delete a session"""
         with self.get_cursor() as cursor:
-            cursor.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
-            if cursor.rowcount > 0:
-                self._ensure_active_session()
-                return True
-        return False
+            cursor.execute(SQL_DELETE_SESSION, (session_id,))
+            deleted = cursor.rowcount > 0
+        
+        # Runs in its own transaction once the delete has committed
+        if deleted:
+            self._ensure_active_session()
+        return deleted
     
     # ================= FILE MANAGEMENT =================
     
-    def add_file(self, session_id, filename, filepath, filesize, content_text="", file_type=""):
+    def add_file(self, session_id, filename, filepath, filesize, content_text="", file_type="",
+                 file_hash=None):
         """Add a file to a session"""
         with self.get_cursor() as cursor:
-            cursor.execute('''
-                INSERT INTO files (session_id, filename, filepath, filesize, content_text, file_type)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (session_id, filename, filepath, filesize, content_text, file_type))
+            cursor.execute(SQL_INSERT_FILE,
+                           (session_id, filename, filepath, filesize, content_text, file_type,
+                            file_hash))
+            file_id = cursor.lastrowid
             
-            cursor.execute('''
-                UPDATE sessions 
-                SET last_accessed = CURRENT_TIMESTAMP 
-                WHERE id = ?
-            ''', (session_id,))
+            cursor.execute(SQL_TOUCH_SESSION, (session_id,))
             
-            return cursor.lastrowid
+            return file_id
     
     def get_session_files(self, session_id):
         """Get all files for a session"""
-        with self.get_cursor() as cursor:
-            cursor.execute('''
-                SELECT id, filename, filesize, upload_time, file_type 
-                FROM files 
-                WHERE session_id = ?
-                ORDER BY upload_time DESC
-            ''', (session_id,))
+        with self.get_read_cursor() as cursor:
+            cursor.execute(SQL_GET_SESSION_FILES, (session_id,))
             
-            files = []
-            for row in cursor.fetchall():
-                files.append({
-                    'id': row[0],
-                    'filename': row[1],
-                    'filesize': row[2] or 0,
-                    'upload_time': row[3],
-                    'file_type': row[4] or 'Unknown'
-                })
-            return files
+            return [dict(row) for row in cursor]
     
     def get_file_content(self, file_id):
         """Get content text of a specific file"""
-        with self.get_cursor() as cursor:
-            cursor.execute('SELECT content_text FROM files WHERE id = ?', (file_id,))
+        with self.get_read_cursor() as cursor:
+            cursor.execute(SQL_GET_FILE_CONTENT, (file_id,))
             row = cursor.fetchone()
             return row[0] if row else ""
     
+    def get_file_by_hash(self, file_hash):
+        """Get the extracted text of a previously uploaded file with this content hash"""
+        with self.get_read_cursor() as cursor:
+            cursor.execute(SQL_GET_CONTENT_BY_HASH, (file_hash,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+    
     def get_session_content(self, session_id):
-        """Get all content text from all files in a session"""
-        with self.get_cursor() as cursor:
-            cursor.execute('''
-                SELECT content_text FROM files 
-                WHERE session_id = ? AND content_text IS NOT NULL AND content_text != ''
-            ''', (session_id,))
+        """Get all content text from all files in a session, newest upload first"""
+        with self.get_read_cursor() as cursor:
+            cursor.execute(SQL_GET_SESSION_CONTENT, (session_id,))
             
-            contents = [row[0] for row in cursor.fetchall()]
-            return "\n\n".join(contents)
+            # Stream rows into one buffer instead of materializing a list first
+            buffer = io.StringIO()
+            separator = ""
+            for row in cursor:
+                buffer.write(separator)
+                buffer.write(row[0])
+                separator = "\n\n"
+            return buffer.getvalue()
     
     def delete_file(self, file_id):
         """Delete a specific file"""
         with self.get_cursor() as cursor:
-            cursor.execute('DELETE FROM files WHERE id = ?', (file_id,))
+            cursor.execute(SQL_DELETE_FILE, (file_id,))
             return cursor.rowcount > 0
     
+    def delete_files_bulk(self, file_ids):
+        """Delete several files in one transaction and remove them from disk"""
+        file_ids = list(file_ids)
+        file_paths = []
+        deleted = 0
+        with self.get_cursor() as cursor:
+            for start in range(0, len(file_ids), IN_CHUNK_SIZE):
+                chunk = file_ids[start:start + IN_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                
+                cursor.execute(SQL_GET_FILEPATHS_IN.format(placeholders=placeholders), chunk)
+                file_paths.extend(row[0] for row in cursor.fetchall())
+                
+                cursor.execute(SQL_DELETE_FILES_IN.format(placeholders=placeholders), chunk)
+                deleted += cursor.rowcount
+        
+        # Unlink after commit, without waiting for the filesystem
+        for filepath in file_paths:
+            if filepath:
+                unlink_executor.submit(_remove_file, filepath)
+        
+        return deleted
+    
     # ================= CHAT MANAGEMENT =================
     
     def add_chat(self, session_id, question, answer):
         """Add a chat message to a session"""
         with self.get_cursor() as cursor:
-            cursor.execute('''
-                INSERT INTO chats (session_id, question, answer)
-                VALUES (?, ?, ?)
-            ''', (session_id, question, answer))
+            cursor.execute(SQL_INSERT_CHAT, (session_id, question, answer))
+            chat_id = cursor.lastrowid
             
-            cursor.execute('''
-                UPDATE sessions 
-                SET last_accessed = CURRENT_TIMESTAMP 
-                WHERE id = ?
-            ''', (session_id,))
+            cursor.execute(SQL_TOUCH_SESSION, (session_id,))
             
-            return cursor.lastrowid
+            return chat_id
     
-    def get_session_chats(self, session_id, limit=50):
-        """Get all chats for a session"""
+    def add_chats_bulk(self, session_id, rows):
+        """Add several (question, answer) pairs to a session in one transaction,
+        returning the new chat ids in insertion order"""
+        rows = iter(rows)
+        chat_ids = []
         with self.get_cursor() as cursor:
-            cursor.execute('''
-                SELECT id, question, answer, created_at 
-                FROM chats 
-                WHERE session_id = ?
-                ORDER BY created_at ASC
-                LIMIT ?
-            ''', (session_id, limit))
+            while True:
+                chunk = [(session_id, question, answer)
+                         for question, answer in islice(rows, BULK_CHUNK_SIZE)]
+                if not chunk:
+                    break
+                cursor.executemany(SQL_INSERT_CHAT, chunk)
+                
+                # AUTOINCREMENT ids are consecutive while we hold the write lock
+                last_id = cursor.execute(SQL_LAST_INSERT_ID).fetchone()[0]
+                chat_ids.extend(range(last_id - len(chunk) + 1, last_id + 1))
+            
+            if chat_ids:
+                cursor.execute(SQL_TOUCH_SESSION, (session_id,))
             
-            chats = []
-            for row in cursor.fetchall():
-                chats.append({
-                    'id': row[0],
-                    'question': row[1],
-                    'answer': row[2],
-                    'created_at': row[3]
-                })
-            return chats
+            return chat_ids
+    
+    def get_session_chats(self, session_id, limit=50):
+        """Get the most recent chats for a session, oldest first"""
+        with self.get_read_cursor() as cursor:
+            cursor.execute(SQL_GET_SESSION_CHATS, (session_id, limit))
+            
+            return [dict(row) for row in cursor]
     
     def get_all_chats(self, limit=100):
         """Get all chats across all sessions"""
-        with self.get_cursor() as cursor:
-            cursor.execute('''
-                SELECT c.id, c.question, c.answer, c.created_at, s.session_name
-                FROM chats c
-                JOIN sessions s ON c.session_id = s.id
-                ORDER BY c.created_at DESC
-                LIMIT ?
-            ''', (limit,))
+        with self.get_read_cursor() as cursor:
+            cursor.execute(SQL_GET_ALL_CHATS, (limit,))
             
-            chats = []
-            for row in cursor.fetchall():
-                chats.append({
-                    'id': row[0],
-                    'question': row[1],
-                    'answer': row[2],
-                    'created_at': row[3],
-                    'session_name': row[4]
-                })
-            return chats
+            return [dict(row) for row in cursor]
     
     def delete_session_chats(self, session_id):
         """Delete all chats for a session"""
         with self.get_cursor() as cursor:
-            cursor.execute('DELETE FROM chats WHERE session_id = ?', (session_id,))
+            cursor.execute(SQL_DELETE_SESSION_CHATS, (session_id,))
             return cursor.rowcount
     
     # ================= STATISTICS =================
     
     def get_stats(self):
         """Get database statistics"""
-        with self.get_cursor() as cursor:
-            cursor.execute('SELECT COUNT(*) FROM sessions')
-            total_sessions = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM sessions WHERE is_active = 1')
-            active_sessions = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM files')
-            total_files = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT SUM(filesize) FROM files')
-            total_size = cursor.fetchone()[0] or 0
-            
-            cursor.execute('SELECT COUNT(*) FROM chats')
-            total_chats = cursor.fetchone()[0]
-            
-            return {
-                'total_sessions': total_sessions,
-                'active_sessions': active_sessions,
-                'total_files': total_files,
-                'total_size': total_size,
-                'total_chats': total_chats
-            }
+        return self._cached(('get_stats',), self._load_stats)
+    
+    def _load_stats(self):
+        with self.get_read_cursor() as cursor:
+            cursor.execute(SQL_GET_STATS)
+            return dict(cursor.fetchone())
     
     def clear_all_data(self):
         """Completely clear all data from database"""
         try:
-            # Get file paths before deletion
+            # Get file paths and delete all rows in one transaction; the
+            # connections, WAL and statement caches all stay alive
             file_paths = []
             with self.get_cursor() as cursor:
-                cursor.execute('SELECT filepath FROM files')
+                cursor.execute(SQL_GET_ALL_FILEPATHS)
                 file_paths = [row[0] for row in cursor.fetchall()]
+                
+                cursor.execute(SQL_DELETE_ALL_CHATS)
+                cursor.execute(SQL_DELETE_ALL_FILES)
+                cursor.execute(SQL_DELETE_ALL_SESSIONS)
             
-            # Close all connections
-            self._close_connection()
-            
-            # Delete database file
-            if os.path.exists(DB_FILE):
-                os.remove(DB_FILE)
+            # Reclaim freed pages (must run outside a transaction)
+            conn = self._get_connection()
+            conn.execute(SQL_VACUUM)
             
-            # Delete uploaded files
-            for filepath in file_paths:
-                if filepath and os.path.exists(filepath):
-                    try:
-                        os.remove(filepath)
-                    except:
-                        pass
+            # Everything under the uploads directory goes with a single
+            # rmtree; any stray paths elsewhere are unlinked concurrently
+            uploads_dir = os.path.abspath(UPLOADS_DIR)
+            stray_paths = [
+                filepath for filepath in file_paths
+                if filepath and os.path.dirname(os.path.abspath(filepath)) != uploads_dir
+            ]
+            list(unlink_executor.map(_remove_file, stray_paths))
+            shutil.rmtree(UPLOADS_DIR, ignore_errors=True)
             
             # Recreate data directory
-            os.makedirs("data/uploads", exist_ok=True)
+            os.makedirs(UPLOADS_DIR, exist_ok=True)
             
-            # Reinitialize database
-            self._init_db()
+            # Recreate the default session and refresh planner statistics
+            self._ensure_active_session()
+            conn.execute(SQL_ANALYZE)
             
             return True
         except Exception as e:
@@ -1,11 +1,15 @@
 import streamlit as st
 import os
 import json
-from datetime import datetime
+import html
+from datetime import datetime, timezone
 from utils import process_file_upload
-from backend import generate_study_response
+from backend import generate_study_response, get_study_context, stream_in_background, StreamBuffer
 from database import db
 
+# Chats shown in the history; matches what a reload fetches
+CHAT_HISTORY_LIMIT = 50
+
 # ================= PAGE CONFIG =================
 st.set_page_config(
     page_title="Smart Study AI",
@@ -155,7 +159,7 @@ def load_initial_data():
             st.session_state.current_session = active_session
             st.session_state.current_session_id = active_session['id']
             st.session_state.session_files = db.get_session_files(active_session['id'])
-            st.session_state.session_chats = db.get_session_chats(active_session['id'])
+            st.session_state.session_chats = db.get_session_chats(active_session['id'], CHAT_HISTORY_LIMIT)
         else:
             # Create default session
             session_id = db.create_session("Default Session")
@@ -176,6 +180,42 @@ def load_initial_data():
         st.session_state.session_chats = []
         st.session_state.all_sessions = []
 
+def save_chat(question, answer):
+    """Save a Q&A pair to the current session"""
+    chat_id = db.add_chat(st.session_state.current_session_id, question, answer)
+    
+    # Mirror the new row locally instead of re-querying the session
+    created_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    chats = st.session_state.session_chats
+    chats.append({'id': chat_id, 'question': question, 'answer': answer, 'created_at': created_at})
+    del chats[:-CHAT_HISTORY_LIMIT]
+    return chat_id
+
+def build_chat_history_html(chats):
+    """Render the whole chat history as a single HTML block"""
+    return "\n".join(
+        f"<div class='chat-message user-message'>"
+        f"<div style='color: #93c5fd; font-weight: bold;'>You:</div>"
+        f"<div style='margin: 0.5rem 0;'>{chat['question']}</div>"
+        f"<div style='font-size: 0.8rem; color: #9ca3af;'>{chat['created_at'][:16]}</div>"
+        f"</div>\n"
+        f"<div class='chat-message ai-message'>"
+        f"<div style='color: #34d399; font-weight: bold;'>AI:</div>"
+        f"<div style='margin: 0.5rem 0;'>{chat['answer']}</div>"
+        f"</div>"
+        for chat in chats
+    )
+
+def build_files_table_html(files):
+    """Render the sidebar file list as a single HTML table"""
+    rows = "\n".join(
+        f"<tr><td>📄 {html.escape(file['filename'][:20])}</td>"
+        f"<td>{file['filesize']/1024:.1f} KB</td>"
+        f"<td>{html.escape((file['upload_time'] or '')[:10])}</td></tr>"
+        for file in files
+    )
+    return f"<table class='file-item'>\n{rows}\n</table>"
+
 # Initialize session state
 init_session_state()
 
@@ -225,13 +265,22 @@ with st.sidebar:
     st.markdown("### 📄 Files")
     
     if st.session_state.session_files:
-        for file in st.session_state.session_files[:5]:
-            with st.expander(f"📄 {file['filename'][:20]}...", expanded=False):
-                st.caption(f"Size: {file['filesize']/1024:.1f} KB")
-                if st.button("Delete", key=f"del_{file['id']}"):
-                    if db.delete_file(file['id']):
-                        load_initial_data()
-                        st.rerun()
+        recent_files = st.session_state.session_files[:5]
+        
+        # Rebuild the table HTML only when the listed files change
+        files_key = tuple(file['id'] for file in recent_files)
+        if st.session_state.get("files_key") != files_key:
+            st.session_state.files_html = build_files_table_html(recent_files)
+            st.session_state.files_key = files_key
+        
+        st.markdown(st.session_state.files_html, unsafe_allow_html=True)
+        
+        # Delete buttons stay as widgets since they carry state
+        for file in recent_files:
+            if st.button(f"🗑️ Delete {file['filename'][:20]}", key=f"del_{file['id']}"):
+                if db.delete_file(file['id']):
+                    load_initial_data()
+                    st.rerun()
     else:
         st.info("No files uploaded")
     
@@ -280,16 +329,19 @@ uploaded_file = st.file_uploader(
 if uploaded_file:
     with st.spinner("Processing file..."):
         try:
-            result = process_file_upload(uploaded_file)
+            result = process_file_upload(uploaded_file, wait=False)
             if result:
                 st.success(f"✅ Uploaded: {uploaded_file.name}")
-                load_initial_data()
                 
                 # Show preview
                 with st.expander("📝 Preview", expanded=False):
                     content = result['content']
                     preview = content[:1000] + ("..." if len(content) > 1000 else "")
                     st.text_area("Extracted text", preview, height=150, disabled=True)
+                
+                # The insert ran while the preview rendered; wait for it before reloading
+                result['file_future'].result()
+                load_initial_data()
         except Exception as e:
             st.error(f"Error uploading file: {e}")
 
@@ -298,31 +350,13 @@ st.markdown("---")
 st.markdown("## 💬 Chat History")
 
 if st.session_state.session_chats:
-    for chat in st.session_state.session_chats:
-        # User message
-        st.markdown(
-            f"""
-            <div class='chat-message user-message'>
-            <div style='color: #93c5fd; font-weight: bold;'>You:</div>
-            <div style='margin: 0.5rem 0;'>{chat['question']}</div>
-            <div style='font-size: 0.8rem; color: #9ca3af;'>
-            {chat['created_at'][:16]}
-            </div>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
-        
-        # AI response
-        st.markdown(
-            f"""
-            <div class='chat-message ai-message'>
-            <div style='color: #34d399; font-weight: bold;'>AI:</div>
-            <div style='margin: 0.5rem 0;'>{chat['answer']}</div>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
+    # Rebuild the history HTML only when the session or its newest chat changes
+    history_key = (st.session_state.current_session_id, st.session_state.session_chats[-1]['id'])
+    if st.session_state.get("history_key") != history_key:
+        st.session_state.history_html = build_chat_history_html(st.session_state.session_chats)
+        st.session_state.history_key = history_key
+    
+    st.markdown(st.session_state.history_html, unsafe_allow_html=True)
 else:
     st.info("No conversations yet. Upload a document and ask a question!")
 
@@ -351,7 +385,10 @@ if generate_btn and question:
     
     try:
         # Get content
-        session_content = db.get_session_content(st.session_state.current_session_id)
+        session_content = get_study_context(
+            st.session_state.current_session_id,
+            tuple(file['id'] for file in st.session_state.session_files)
+        )
         
         if not session_content or len(session_content.strip()) < 10:
             st.error("No readable content found. Please upload valid documents.")
@@ -373,14 +410,19 @@ if generate_btn and question:
         
         # Stream response
         full_response = ""
+        stream_buffer = StreamBuffer()
         st.session_state.streaming = True
         
         try:
-            for token in generate_study_response(session_content, question):
+            tokens = generate_study_response(session_content, question)
+            for token in stream_in_background(tokens):
                 if not st.session_state.streaming:
                     break
                 
-                full_response += token
+                # Only re-render once enough tokens have been coalesced
+                if not stream_buffer.add(token):
+                    continue
+                full_response += stream_buffer.flush()
                 
                 # Update display
                 response_container.markdown(
@@ -393,6 +435,8 @@ if generate_btn and question:
                     unsafe_allow_html=True
                 )
             
+            full_response += stream_buffer.flush()
+            
             # Final display without streaming dot
             if full_response:
                 response_container.markdown(
@@ -406,10 +450,10 @@ if generate_btn and question:
                 )
                 
                 # Save to database
-                db.add_chat(st.session_state.current_session_id, question, full_response)
+                save_chat(question, full_response)
                 
-                # Refresh data
-                load_initial_data()
+                # Only the session list (chat counts) needs a refresh
+                st.session_state.all_sessions = db.get_all_sessions()
                 st.success("✓ Response saved!")
         
         except Exception as e:
@@ -432,6 +476,8 @@ with st.expander("🔧 Database Tools", expanded=False):
             if st.button("🗑️ DELETE ALL DATA", type="primary"):
                 try:
                     if db.clear_all_data():
+                        get_study_context.cache_clear()
+                        
                         # Clear session state
                         for key in list(st.session_state.keys()):
                             del st.session_state[key]
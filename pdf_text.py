@@ -0,0 +1,201 @@
+# Page-text extraction for pypdf, kept free of app imports (database, UI) so
+# spawned pool workers can import it cheaply
+import mmap
+from pypdf import PdfReader
+
+# PdfReader opened once per worker process by init_pdf_worker
+_worker_reader = None
+
+# Content-stream operators that affect extracted text or the pen position;
+# all others are skipped
+_TEXT_OPERATORS = {b"BT", b"Tj", b"TJ", b"'", b'"', b"Tf", b"Tm", b"Td", b"TD", b"T*",
+                   b"TL", b"Tc", b"Tw", b"Tz"}
+
+# TJ kerning (thousandths of an em) wide enough to count as a word gap
+_TJ_SPACE_THRESHOLD = -200
+
+# Fraction of the font's space width a same-line move must leave blank to
+# count as a word gap
+_SPACE_GAP_RATIO = 0.5
+
+# Simple-font encodings whose bytes map directly onto a Python codec;
+# StandardEncoding (ligatures, curly quotes) has no codec and goes to pypdf
+_SIMPLE_FONT_CODECS = {
+    "/WinAnsiEncoding": "cp1252",
+    "/MacRomanEncoding": "mac_roman",
+}
+
+def _simple_fonts(page):
+    """
+    Map each font resource on the page to (codec, first_char, widths,
+    missing_width), or return None when the page needs pypdf's full extractor
+    (composite/ToUnicode fonts, encodings without a Python codec such as
+    StandardEncoding or built-in ones, fonts without a /Widths array, or form
+    XObjects that can hold text of their own).
+    """
+    resources = page.get("/Resources")
+    if resources is None:
+        return {}
+    resources = resources.get_object()
+    
+    xobjects = resources.get("/XObject")
+    if xobjects is not None:
+        for xobject in xobjects.get_object().values():
+            if xobject.get_object().get("/Subtype") == "/Form":
+                return None
+    
+    simple_fonts = {}
+    fonts = resources.get("/Font")
+    for name, font in (fonts.get_object() if fonts is not None else {}).items():
+        font = font.get_object()
+        if font.get("/Subtype") not in ("/Type1", "/TrueType") or "/ToUnicode" in font:
+            return None
+        
+        # No /Encoding means the font's built-in encoding, which has no codec either
+        encoding = font.get("/Encoding")
+        codec = _SIMPLE_FONT_CODECS.get(encoding) if isinstance(encoding, str) else None
+        widths = font.get("/Widths")
+        if codec is None or widths is None:
+            return None
+        
+        descriptor = font.get("/FontDescriptor")
+        descriptor = descriptor.get_object() if descriptor is not None else {}
+        simple_fonts[name] = (
+            codec,
+            int(font.get("/FirstChar", 0)),
+            [float(width) for width in widths.get_object()],
+            float(descriptor.get("/MissingWidth", 0)),
+        )
+    return simple_fonts
+
+def _fast_page_text(page, fonts):
+    """
+    Walk the content stream, dispatching only on text operators. The pen is
+    tracked from glyph widths so a move along the same baseline only becomes
+    a space when it leaves a gap (kerned or justified fragments stay joined).
+    """
+    contents = page.get_contents()
+    if contents is None:
+        return ""
+    
+    parts = []
+    codec, first_char, widths, missing_width = "latin-1", 0, [], 0.0
+    font_size = char_spacing = word_spacing = leading = 0.0
+    h_scale = 1.0
+    scale_x = scale_y = 1.0           # text matrix scale
+    origin_x = origin_y = 0.0         # start of the current line, user space
+    pen_x, line_y = 0.0, None         # end of the last shown text
+    
+    def glyph_width(code):
+        i = code - first_char
+        return widths[i] if 0 <= i < len(widths) else missing_width
+    
+    def show(string):
+        nonlocal pen_x
+        raw = bytes(getattr(string, "original_bytes", string))
+        parts.append(raw.decode(codec, errors="ignore"))
+        advance = sum(glyph_width(code) for code in raw) / 1000 * font_size
+        advance += char_spacing * len(raw) + word_spacing * raw.count(b" ")
+        pen_x += advance * h_scale * scale_x
+    
+    def move_to(x, y):
+        # New baseline -> line break, same baseline -> space only across a gap
+        nonlocal origin_x, origin_y, pen_x, line_y
+        if y != line_y:
+            parts.append("\n")
+        else:
+            space = (glyph_width(32) or missing_width or 250) / 1000 * font_size
+            if x - pen_x >= _SPACE_GAP_RATIO * space * h_scale * scale_x:
+                parts.append(" ")
+        origin_x = pen_x = x
+        origin_y = line_y = y
+    
+    def next_line():
+        nonlocal origin_y, pen_x, line_y
+        parts.append("\n")
+        origin_y -= leading * scale_y
+        pen_x, line_y = origin_x, origin_y
+    
+    for operands, operator in contents.operations:
+        if operator not in _TEXT_OPERATORS:
+            continue
+        
+        if operator == b"Tj":
+            show(operands[0])
+        elif operator == b"TJ":
+            for item in operands[0]:
+                if isinstance(item, (int, float)):
+                    if item < _TJ_SPACE_THRESHOLD:
+                        parts.append(" ")
+                    pen_x -= item / 1000 * font_size * h_scale * scale_x
+                else:
+                    show(item)
+        elif operator in (b"'", b'"'):
+            if operator == b'"':
+                word_spacing, char_spacing = float(operands[0]), float(operands[1])
+            next_line()
+            show(operands[-1])
+        elif operator == b"Tf":
+            font_size = float(operands[1])
+            codec, first_char, widths, missing_width = fonts.get(
+                operands[0], ("latin-1", 0, [], 0.0))
+        elif operator == b"Tm":
+            a, b, c, d, e, f = (float(operand) for operand in operands)
+            if b or c:
+                raise ValueError("rotated or skewed text")
+            scale_x, scale_y = a, d
+            move_to(e, f)
+        elif operator in (b"Td", b"TD"):
+            tx, ty = float(operands[0]), float(operands[1])
+            if operator == b"TD":
+                leading = -ty
+            move_to(origin_x + tx * scale_x, origin_y + ty * scale_y)
+        elif operator == b"T*":
+            next_line()
+        elif operator == b"BT":
+            scale_x = scale_y = 1.0
+            origin_x = origin_y = 0.0
+        elif operator == b"TL":
+            leading = float(operands[0])
+        elif operator == b"Tc":
+            char_spacing = float(operands[0])
+        elif operator == b"Tw":
+            word_spacing = float(operands[0])
+        else:
+            h_scale = float(operands[0]) / 100
+    
+    return "".join(parts)
+
+def page_text(page):
+    """Extract a page's text, using the text-operator fast path when safe"""
+    if "/Contents" in page:
+        try:
+            fonts = _simple_fonts(page)
+            if fonts is not None:
+                return _fast_page_text(page, fonts)
+        except Exception:
+            pass
+    return page.extract_text() or ""
+
+def map_pdf(file_path):
+    """Memory-map a PDF read-only so pypdf's seeks and reads stay in-process"""
+    with open(file_path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # pypdf jumps between the xref table and objects, so ask for the whole
+    # file up front rather than sequential readahead
+    if hasattr(mm, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+        mm.madvise(mmap.MADV_WILLNEED)
+    return mm
+
+def init_pdf_worker(source):
+    """Open the PDF once in each worker process"""
+    global _worker_reader
+    if isinstance(source, str):
+        # Mapped for the worker's lifetime; pages are parsed lazily
+        source = map_pdf(source)
+    _worker_reader = PdfReader(source)
+
+def extract_page_range(start, stop):
+    """Extract text from pages [start, stop) in a worker process"""
+    pages = _worker_reader.pages
+    return "".join(page_text(pages[i]) for i in range(start, stop))
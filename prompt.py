@@ -1,20 +1,20 @@
-def study_prompt(context_text, user_question):
-    """
-    Creates a structured prompt for study-based AI responses
-    """
-
-    return f"""
+# Constant pieces of the study prompt, built once at import time
+_HEAD = """
 You are an intelligent and helpful study assistant.
 
 ============================
 STUDY MATERIAL
 ============================
-{context_text}
+"""
+
+_MID = """
 
 ============================
 STUDENT QUESTION
 ============================
-{user_question}
+"""
+
+_TAIL = """
 
 ============================
 INSTRUCTIONS
@@ -26,4 +26,11 @@ INSTRUCTIONS
 - If the answer is not in the material, say:
   "This information is not available in the uploaded content."
 - Do NOT add extra unrelated knowledge
-"""
\ No newline at end of file
+"""
+
+def study_prompt(context_text, user_question):
+    """
+    Creates a structured prompt for study-based AI responses
+    """
+
+    return "".join((_HEAD, context_text, _MID, user_question, _TAIL))
\ No newline at end of file
@@ -1,19 +1,32 @@
 # reset.py
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+def _unlink_all(directory, max_workers=16):
+    """Unlink every file under directory concurrently (unlink releases the GIL)"""
+    files = [os.path.join(dirpath, name)
+             for dirpath, _, filenames in os.walk(directory)
+             for name in filenames]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(os.unlink, files))
 
 def reset_app():
     """Reset the application data"""
     print("Resetting Smart Study AI...")
     
-    # Delete database
+    # Delete database (plus its WAL sidecar files)
     if os.path.exists("data/study_ai.db"):
         os.remove("data/study_ai.db")
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists("data/study_ai.db" + suffix):
+                os.remove("data/study_ai.db" + suffix)
         print("✓ Database deleted")
     
     # Delete uploads
     if os.path.exists("data/uploads"):
-        shutil.rmtree("data/uploads")
+        _unlink_all("data/uploads")
+        shutil.rmtree("data/uploads")  # cleanup now-empty dirs
         print("✓ Uploads deleted")
     
     # Recreate directories
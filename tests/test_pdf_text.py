@@ -0,0 +1,51 @@
+import sys
+import os
+import unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (ArrayObject, DecodedStreamObject, DictionaryObject,
+                           FloatObject, NameObject, NumberObject)
+
+from pdf_text import _simple_fonts, page_text
+
+def _one_font_page(tmp_path, encoding, content):
+    """Write a single-page PDF with one Type1 font (with /Widths) and read it back"""
+    writer = PdfWriter()
+    page = writer.add_blank_page(612, 792)
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+        NameObject("/Encoding"): NameObject(encoding),
+        NameObject("/FirstChar"): NumberObject(32),
+        NameObject("/LastChar"): NumberObject(255),
+        NameObject("/Widths"): ArrayObject([FloatObject(500)] * 224),
+    })
+    page[NameObject("/Resources")] = DictionaryObject({
+        NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)})
+    })
+    stream = DecodedStreamObject()
+    stream.set_data(content)
+    page[NameObject("/Contents")] = writer._add_object(stream)
+    
+    path = tmp_path / "page.pdf"
+    writer.write(path)
+    return PdfReader(path).pages[0]
+
+def test_standard_encoding_uses_full_extractor(tmp_path):
+    page = _one_font_page(tmp_path, "/StandardEncoding",
+                          b"BT /F1 12 Tf 72 700 Td (\xaele it's a `quote') Tj ET")
+    
+    assert _simple_fonts(page) is None
+    text = unicodedata.normalize("NFKC", page_text(page))
+    assert text.startswith("file")
+    assert "®" not in text
+
+def test_win_ansi_same_line_fragments_stay_joined(tmp_path):
+    page = _one_font_page(tmp_path, "/WinAnsiEncoding",
+                          b"BT /F1 10 Tf 72 700 Td (Spli) Tj 20 0 Td (tted) Tj 30 0 Td (word) Tj ET")
+    
+    assert _simple_fonts(page) is not None
+    assert page_text(page).split() == ["Splitted", "word"]
@@ -1,92 +1,252 @@
 import os
+import io
+import multiprocessing
+import time
+import hashlib
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pypdf import PdfReader
 from docx import Document
-from database import db
+from lxml import etree
+from database import db, UPLOADS_DIR
+from pdf_text import map_pdf, page_text, init_pdf_worker, extract_page_range
 
-UPLOAD_DIR = "data/uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Optional native PDF backend (PDFium); pypdf is used when it isn't installed
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
 
-def save_uploaded_file(uploaded_file):
-    """Save uploaded file to disk"""
-    from datetime import datetime
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+# PDFium is not thread-safe; every call into it goes through this lock
+_pdfium_lock = threading.Lock()
+
+os.makedirs(UPLOADS_DIR, exist_ok=True)
+
+# Bytes handed to each os.write call when saving uploads
+WRITE_CHUNK_SIZE = 1 << 20
+
+# PDFs with fewer pages are extracted in-process; spawning workers that each
+# import pypdf costs about half a second
+PARALLEL_PDF_MIN_PAGES = 200
+
+# Spawn (not fork) so workers don't inherit the server's threads and only
+# import pdf_text, never this module or the database
+_pdf_pool_context = multiprocessing.get_context("spawn")
+
+# Messages the extractors return in place of text when they fail
+_EXTRACTION_ERRORS = ("Error reading ", "Error extracting text: ", "Unsupported file format: ")
+
+# Pending (func, kwargs, future) database writes for _db_worker
+_db_queue = queue.Queue(maxsize=32)
+
+# WordprocessingML text nodes and paragraph/line breaks in document order,
+# skipping mc:Fallback copies of content (e.g. legacy text boxes)
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_W_P = f"{{{_W_NS}}}p"
+_W_T = f"{{{_W_NS}}}t"
+_DOCX_TEXT_NODES = etree.XPath(
+    "(.//w:p | .//w:t | .//w:tab | .//w:br | .//w:cr)[not(ancestor::mc:Fallback)]",
+    namespaces={
+        "w": _W_NS,
+        "mc": "http://schemas.openxmlformats.org/markup-compatibility/2006",
+    },
+)
+
+def _db_worker():
+    """Run queued database writes in order, resolving each future"""
+    while True:
+        func, kwargs, future = _db_queue.get()
+        try:
+            future.set_result(func(**kwargs))
+        except Exception as e:
+            future.set_exception(e)
+
+threading.Thread(target=_db_worker, name="db-writer", daemon=True).start()
+
+def _submit_db_write(func, **kwargs):
+    """Queue a database write and return a Future for its result"""
+    future = Future()
+    _db_queue.put((func, kwargs, future))
+    return future
+
+def _build_file_info(uploaded_file, file_content):
+    """Pick the on-disk name for an upload and describe it"""
+    # Nanosecond hex timestamp: cheap to format and unique across burst uploads
+    timestamp = f"{time.time_ns():x}"
     safe_name = uploaded_file.name.replace(" ", "_")
     filename = f"{timestamp}_{safe_name}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    
-    # Save file
-    file_content = uploaded_file.getbuffer()
-    with open(file_path, "wb") as f:
-        f.write(file_content)
+    file_path = os.path.join(UPLOADS_DIR, filename)
     
     return {
         'filename': filename,
         'original_name': uploaded_file.name,
         'file_path': file_path,
         'file_size': len(file_content),
-        'file_type': uploaded_file.type or uploaded_file.name.split('.')[-1].lower()
+        'file_type': uploaded_file.type or uploaded_file.name.split('.')[-1].lower(),
+        'file_hash': hashlib.sha256(file_content).hexdigest()
     }
 
-def extract_text_from_file(file_path, file_type):
-    """Extract text from supported file types"""
+def _write_file(file_path, file_content):
+    """Write file content to disk in large chunks, bypassing Python's buffered I/O"""
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    fd = os.open(file_path, flags, 0o644)
     try:
-        if 'pdf' in file_type.lower() or file_path.endswith('.pdf'):
-            return extract_pdf(file_path)
-        elif 'text' in file_type.lower() or file_path.endswith('.txt'):
-            return extract_txt(file_path)
-        elif 'word' in file_type.lower() or file_path.endswith('.docx'):
-            return extract_docx(file_path)
-        else:
-            if file_path.endswith('.pdf'):
-                return extract_pdf(file_path)
-            elif file_path.endswith('.txt'):
-                return extract_txt(file_path)
-            elif file_path.endswith('.docx'):
-                return extract_docx(file_path)
-            else:
-                return f"Unsupported file format: {file_type}"
+        view = memoryview(file_content).cast('B')
+        while view:
+            written = os.write(fd, view[:WRITE_CHUNK_SIZE])
+            view = view[written:]
+    finally:
+        os.close(fd)
+
+def save_uploaded_file(uploaded_file):
+    """Save uploaded file to disk"""
+    file_content = uploaded_file.getbuffer()
+    file_info = _build_file_info(uploaded_file, file_content)
+    _write_file(file_info['file_path'], file_content)
+    return file_info
+
+def extract_text_from_file(source, file_type, file_name=None):
+    """
+    Extract text from supported file types.
+    source is a path or a binary file-like object; pass file_name for the
+    extension check when it isn't a path.
+    """
+    name = file_name or source
+    try:
+        extractor = (_EXTRACTORS.get(os.path.splitext(name)[1].lower())
+                     or _MIME_EXTRACTORS.get(file_type))
+        if extractor is None:
+            return f"Unsupported file format: {file_type}"
+        return extractor(source)
     except Exception as e:
         return f"Error extracting text: {str(e)}"
 
-def extract_pdf(file_path):
-    text = ""
+def _extract_pdf_parallel(file_path, n_pages):
+    """Extract page text across a process pool, preserving page order"""
+    workers = min(os.cpu_count() or 1, n_pages)
+    step = max(1, n_pages // (4 * workers))
+    starts = range(0, n_pages, step)
+    stops = [min(start + step, n_pages) for start in starts]
+    
+    # Workers map the file themselves; only the path is pickled
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pdf_pool_context,
+                             initializer=init_pdf_worker,
+                             initargs=(file_path,)) as executor:
+        return "".join(executor.map(extract_page_range, starts, stops))
+
+def _extract_pdf_pdfium(source):
+    """Extract all page text with PDFium"""
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(source)
+        try:
+            # Close pages explicitly so no PDFium handle is freed by GC outside the lock
+            parts = []
+            for i in range(len(pdf)):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                parts.append(textpage.get_text_range())
+                textpage.close()
+                page.close()
+            return "\n".join(parts)
+        finally:
+            pdf.close()
+
+def extract_pdf(source):
+    if pdfium is not None:
+        try:
+            return clean_text(_extract_pdf_pdfium(source))
+        except Exception:
+            pass  # fall back to pypdf
+    
+    mm = None
     try:
-        reader = PdfReader(file_path)
-        for page in reader.pages:
-            text += page.extract_text() or ""
+        if hasattr(source, "seek"):
+            source.seek(0)
+            reader = PdfReader(source)
+        else:
+            mm = map_pdf(source)
+            reader = PdfReader(mm)
+        n_pages = len(reader.pages)
+        # In-memory sources stay in-process rather than being pickled to workers
+        if (mm is not None and n_pages >= PARALLEL_PDF_MIN_PAGES
+                and (os.cpu_count() or 1) > 1):
+            # Workers map the file themselves; drop the parent's reader and map
+            # rather than holding them for the whole pool run
+            del reader
+            mm.close()
+            text = _extract_pdf_parallel(source, n_pages)
+        else:
+            parts = []
+            for page in reader.pages:
+                parts.append(page_text(page))
+            text = "".join(parts)
     except Exception as e:
         return f"Error reading PDF: {e}"
+    finally:
+        if mm is not None:
+            mm.close()
     return clean_text(text)
 
-def extract_txt(file_path):
+def extract_txt(source):
     try:
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            return clean_text(f.read())
+        if hasattr(source, "read"):
+            raw = source.read()
+        else:
+            with open(source, "rb") as f:
+                raw = f.read()
+        
+        # Strip NULs on the bytes and decode once; the error handler is only
+        # needed when the file isn't valid UTF-8
+        raw = raw.replace(b"\x00", b"")
+        try:
+            text = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            text = raw.decode("utf-8", errors="ignore")
+        return clean_text(text)
     except Exception as e:
         return f"Error reading TXT: {e}"
 
-def extract_docx(file_path):
+def extract_docx(source):
     try:
-        doc = Document(file_path)
-        text = "\n".join(p.text for p in doc.paragraphs)
-        return clean_text(text)
+        doc = Document(source)
+        
+        # Walk the body XML directly instead of building paragraph/run objects
+        parts = []
+        for node in _DOCX_TEXT_NODES(doc.element.body):
+            if node.tag == _W_T:
+                parts.append(node.text or "")
+            elif node.tag == _W_P:
+                parts.append("\n")
+            else:
+                parts.append(" ")
+        return clean_text("".join(parts))
     except Exception as e:
         return f"Error reading DOCX: {e}"
 
+# Extractor per file extension, with the upload MIME type as a fallback
+_EXTRACTORS = {'.pdf': extract_pdf, '.txt': extract_txt, '.docx': extract_docx}
+_MIME_EXTRACTORS = {
+    'application/pdf': extract_pdf,
+    'text/plain': extract_txt,
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': extract_docx,
+}
+
 def clean_text(text):
     """Normalize extracted text"""
     if not text:
         return ""
     
-    text = text.replace("\x00", "")
-    import re
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'\n+', '\n', text)
-    
-    return text.strip()
+    # split() drops leading/trailing whitespace and splits on every run, so
+    # the join collapses and strips in one C-level pass
+    return " ".join(text.replace("\x00", "").split())
 
-def process_file_upload(uploaded_file):
-    """Process file upload"""
+def process_file_upload(uploaded_file, wait=True):
+    """
+    Process file upload.
+    With wait=False the database insert finishes in the background: file_id
+    is None and result['file_future'] resolves to it.
+    """
     # Get active session
     active_session = db.get_active_session()
     if not active_session:
@@ -94,24 +254,48 @@ def process_file_upload(uploaded_file):
     else:
         session_id = active_session['id']
     
-    # Save file
-    file_info = save_uploaded_file(uploaded_file)
+    # Write the file to disk and, except for PDFs, extract its text from
+    # memory concurrently instead of reading it straight back
+    file_content = uploaded_file.getvalue()
+    file_info = _build_file_info(uploaded_file, file_content)
+    
+    # Identical bytes were extracted before: reuse that text, unless it is an
+    # error message stored by an older version
+    extracted_text = db.get_file_by_hash(file_info['file_hash'])
+    if extracted_text is not None and not extracted_text.startswith(_EXTRACTION_ERRORS):
+        _write_file(file_info['file_path'], file_content)
+    elif file_info['filename'].lower().endswith('.pdf'):
+        # PDFs are read back from the written file: large ones are split across
+        # the page pool, whose workers open the path themselves
+        _write_file(file_info['file_path'], file_content)
+        extracted_text = extract_text_from_file(file_info['file_path'], file_info['file_type'])
+    else:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            write = executor.submit(_write_file, file_info['file_path'], file_content)
+            extract = executor.submit(extract_text_from_file, io.BytesIO(file_content),
+                                      file_info['file_type'], file_info['filename'])
+            write.result()
+            extracted_text = extract.result()
     
-    # Extract text
-    extracted_text = extract_text_from_file(file_info['file_path'], file_info['file_type'])
+    # Only successful extractions are reusable by hash; a failure may be fixed
+    # by a different backend or a later version
+    failed = extracted_text.startswith(_EXTRACTION_ERRORS)
     
-    # Store in database
-    file_id = db.add_file(
+    # Store in database off the calling thread
+    file_future = _submit_db_write(
+        db.add_file,
         session_id=session_id,
         filename=file_info['original_name'],
         filepath=file_info['file_path'],
         filesize=file_info['file_size'],
         content_text=extracted_text,
-        file_type=file_info['file_type']
+        file_type=file_info['file_type'],
+        file_hash=None if failed else file_info['file_hash']
     )
     
     return {
-        'file_id': file_id,
+        'file_id': file_future.result() if wait else None,
+        'file_future': file_future,
         'session_id': session_id,
         'filename': file_info['original_name'],
         'content': extracted_text